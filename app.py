@@ -1,14 +1,36 @@
 from flask import Flask, render_template, request, jsonify
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
+from flask_compress import Compress
 import os
-import json
+import orjson
+import zlib
+import atexit
+import threading
+from array import array
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from functools import lru_cache
+from operator import attrgetter
+from cachetools import TTLCache
+import httplib2
+import redis
+import requests
+from redis.commands.search.field import TagField, VectorField
+from redis.commands.search.indexDefinition import IndexDefinition, IndexType
+from redis.commands.search.query import Query
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import google.generativeai as genai
 import googleapiclient.discovery
 import googleapiclient.errors
 import logging
 from dotenv import load_dotenv
+from typing_extensions import TypedDict
 from youtube_transcript_api import YouTubeTranscriptApi, TranscriptsDisabled, NoTranscriptFound
 import html
+import re
 
 # Load environment variables
 load_dotenv()
@@ -17,10 +39,37 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Pattern for extracting the 11 character video ID from YouTube URLs
+_VIDEO_ID_RE = re.compile(r'(?:youtu\.be/|youtube\.com/watch\?(?:[^#]*?&)??v=)([A-Za-z0-9_-]{11})(?![A-Za-z0-9_-])')
+
+# Patterns for converting SRT captions to plain text
+_SRT_STRIP = re.compile(
+    r'^\d+\s*\n\d{2}:\d{2}:\d{2}[,.]\d{3}\s*-->\s*\d{2}:\d{2}:\d{2}[,.]\d{3}.*(?:\r?\n|\Z)',
+    re.MULTILINE
+)
+_TAG_STRIP = re.compile(r'<[^>]+>')
+
+class ORJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson for faster (de)serialization."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 # Initialize Flask app
 app = Flask(__name__)
+app.json = ORJSONProvider(app)
 CORS(app)  # Enable CORS for all routes
 
+# Compress JSON responses over 1KB, preferring Brotli
+app.config["COMPRESS_ALGORITHM"] = ["br", "gzip"]
+app.config["COMPRESS_MIN_SIZE"] = 1024
+app.config["COMPRESS_LEVEL"] = 4
+app.config["COMPRESS_BR_LEVEL"] = 4
+Compress(app)
+
 # Configure API Keys - Get from environment or App Service Configuration
 YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
@@ -28,34 +77,249 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 # Configure Gemini API
 genai.configure(api_key=GEMINI_API_KEY)
 
-# Initialize YouTube API client
-youtube = googleapiclient.discovery.build("youtube", "v3", developerKey=YOUTUBE_API_KEY)
+class QuizQuestion(TypedDict):
+    question: str
+    options: list[str]
+    correct_answer: str
+    explanation: str
+
+# Response schema enforced server-side by Gemini for quiz generation
+QUIZ_SCHEMA = list[QuizQuestion]
+
+# Gemini models are created once and shared by all requests; the quiz model
+# runs in JSON mode with QUIZ_SCHEMA so its response can be parsed directly
+GEMINI_MODEL = genai.GenerativeModel('gemini-1.5-pro')
+QUIZ_MODEL = genai.GenerativeModel(
+    'gemini-1.5-pro',
+    generation_config={
+        "response_mime_type": "application/json",
+        "response_schema": QUIZ_SCHEMA
+    }
+)
+
+# YouTube API clients on top of persistent httplib2 connections. httplib2.Http
+# is not safe to share between concurrent callers, so each call checks a
+# client out of this pool and returns it afterwards
+YOUTUBE_POOL_SIZE = 20
+_youtube_pool = []
+_youtube_pool_lock = threading.Lock()
+
+@contextmanager
+def youtube_client():
+    """Check a YouTube API client out of the shared pool, creating one if it is empty."""
+    with _youtube_pool_lock:
+        client = _youtube_pool.pop() if _youtube_pool else None
+    if client is None:
+        client = googleapiclient.discovery.build(
+            "youtube", "v3",
+            developerKey=YOUTUBE_API_KEY,
+            http=httplib2.Http(cache=".httpcache")
+        )
+    try:
+        yield client
+    finally:
+        with _youtube_pool_lock:
+            if len(_youtube_pool) < YOUTUBE_POOL_SIZE:
+                _youtube_pool.append(client)
+
+# Shared keep-alive session for the transcript API
+transcript_session = requests.Session()
+transcript_session.mount("https://", HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=20,
+    max_retries=Retry(total=3, backoff_factor=0.3)
+))
+atexit.register(transcript_session.close)
+transcript_api = YouTubeTranscriptApi(http_client=transcript_session)
+
+# Initialize Redis client used to cache YouTube and Gemini results
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+TRANSCRIPT_CACHE_TTL = 3600
+QUIZ_CACHE_TTL = 86400
+# Caption track lists live as long as the quizzes they lead to, since
+# captions.list costs 50 quota units per call
+CAPTION_TRACKS_CACHE_TTL = QUIZ_CACHE_TTL
+r = redis.Redis.from_url(REDIS_URL, socket_timeout=0.5, socket_connect_timeout=0.5)
+cache_stats = Counter()
+
+# Semantic quiz cache: transcripts are embedded and matched against previously
+# quizzed transcripts in a RediSearch HNSW vector index (requires Redis Stack)
+EMBEDDING_MODEL = "models/text-embedding-004"
+EMBEDDING_DIM = 768
+EMBEDDING_PREFIX_CHARS = 2048
+SEMANTIC_INDEX = "idx:quiz:sem"
+SEMANTIC_PREFIX = "quiz:sem:"
+SEMANTIC_MAX_DISTANCE = 0.05
+_semantic_state = {"ready": False, "disabled": False}
+_semantic_lock = threading.Lock()
+
+# In-process cache of successful video metadata lookups
+VIDEO_INFO_CACHE_TTL = 3600
+_video_info_cache = TTLCache(maxsize=2048, ttl=VIDEO_INFO_CACHE_TTL)
+_video_info_lock = threading.Lock()
+
+# Thread pool for overlapping independent network calls within a request.
+# Under gevent its workers are greenlets, so it is sized from gunicorn's
+# worker_connections; each request uses up to two slots
+WORKER_CONNECTIONS = int(os.getenv("WORKER_CONNECTIONS", 200))
+executor = ThreadPoolExecutor(max_workers=int(os.getenv("FETCH_WORKERS", 2 * WORKER_CONNECTIONS)))
+
+# Quiz generations currently running, keyed by quiz cache key
+_inflight_quizzes = {}
+_inflight_lock = threading.Lock()
+
+# Separate pool for Gemini quiz generations started in the background, so
+# long-running LLM calls can't starve the fetch pool
+quiz_executor = ThreadPoolExecutor(max_workers=int(os.getenv("QUIZ_WORKERS", WORKER_CONNECTIONS)))
+
+# Start the description-based quiz if the transcript is still loading after
+# SPECULATIVE_QUIZ_WAIT seconds; off by default as it may cost a Gemini call
+SPECULATIVE_QUIZ = os.getenv("SPECULATIVE_QUIZ", "False").lower() == "true"
+SPECULATIVE_QUIZ_WAIT = float(os.getenv("SPECULATIVE_QUIZ_WAIT", 2.5))
+
+def cache_get(key):
+    """Return the cached value for key, or None on a miss or Redis failure."""
+    try:
+        cached = r.get(key)
+    except redis.RedisError as e:
+        logger.warning(f"Redis unavailable, skipping cache lookup for {key}: {str(e)}")
+        return None
+
+    if cached is None:
+        cache_stats["miss"] += 1
+        logger.info(f"Cache miss for {key} (hits={cache_stats['hit']}, misses={cache_stats['miss']})")
+        return None
+
+    cache_stats["hit"] += 1
+    logger.info(f"Cache hit for {key} (hits={cache_stats['hit']}, misses={cache_stats['miss']})")
+    return orjson.loads(zlib.decompress(cached))
+
+def cache_set(key, ttl, value):
+    """Store value under key as compressed JSON; Redis failures are only logged."""
+    try:
+        r.setex(key, ttl, zlib.compress(orjson.dumps(value)))
+    except redis.RedisError as e:
+        logger.warning(f"Redis unavailable, could not cache {key}: {str(e)}")
+
+def ensure_semantic_index():
+    """Create the vector index on first use; return False if it is unavailable."""
+    if _semantic_state["ready"] or _semantic_state["disabled"]:
+        return _semantic_state["ready"]
+    
+    with _semantic_lock:
+        if _semantic_state["ready"] or _semantic_state["disabled"]:
+            return _semantic_state["ready"]
+        try:
+            r.ft(SEMANTIC_INDEX).create_index(
+                [
+                    TagField("num_questions"),
+                    VectorField("embedding", "HNSW", {
+                        "TYPE": "FLOAT32",
+                        "DIM": EMBEDDING_DIM,
+                        "DISTANCE_METRIC": "COSINE"
+                    })
+                ],
+                definition=IndexDefinition(prefix=[SEMANTIC_PREFIX], index_type=IndexType.HASH)
+            )
+            _semantic_state["ready"] = True
+        except redis.ResponseError as e:
+            if "Index already exists" in str(e):
+                _semantic_state["ready"] = True
+            else:
+                # Plain Redis without the search module; stop retrying
+                logger.warning(f"Semantic quiz cache disabled: {str(e)}")
+                _semantic_state["disabled"] = True
+        except redis.RedisError as e:
+            logger.warning(f"Redis unavailable, could not create semantic index: {str(e)}")
+    return _semantic_state["ready"]
+
+def embed_transcript(transcript):
+    """Embed the start of a transcript for semantic cache lookups, or return None."""
+    if not ensure_semantic_index():
+        return None
+    try:
+        result = genai.embed_content(
+            model=EMBEDDING_MODEL,
+            content=transcript[:EMBEDDING_PREFIX_CHARS],
+            task_type="semantic_similarity"
+        )
+        return array('f', result["embedding"]).tobytes()
+    except Exception as e:
+        logger.warning(f"Could not embed transcript: {str(e)}")
+        return None
+
+def find_similar_quiz(embedding, num_questions):
+    """Return a cached quiz for a near-identical transcript, or None."""
+    if embedding is None:
+        return None
+    query = (
+        Query(f"(@num_questions:{{{num_questions}}})=>[KNN 1 @embedding $vec AS distance]")
+        .sort_by("distance")
+        .return_fields("quiz", "distance")
+        .dialect(2)
+    )
+    try:
+        results = r.ft(SEMANTIC_INDEX).search(query, query_params={"vec": embedding})
+    except redis.RedisError as e:
+        logger.warning(f"Semantic cache lookup failed: {str(e)}")
+        return None
+    
+    if results.docs and float(results.docs[0].distance) < SEMANTIC_MAX_DISTANCE:
+        logger.info(f"Semantic cache hit on {results.docs[0].id} (distance={results.docs[0].distance})")
+        return orjson.loads(results.docs[0].quiz)
+    return None
+
+def store_similar_quiz(video_id, num_questions, embedding, quiz):
+    """Index a generated quiz by its transcript embedding."""
+    key = f"{SEMANTIC_PREFIX}{video_id}:{num_questions}"
+    try:
+        pipe = r.pipeline()
+        pipe.hset(key, mapping={
+            "embedding": embedding,
+            "quiz": orjson.dumps(quiz),
+            "num_questions": num_questions
+        })
+        pipe.expire(key, QUIZ_CACHE_TTL)
+        pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Redis unavailable, could not index quiz {key}: {str(e)}")
+
+# Longest URL accepted by extract_video_id
+MAX_URL_LENGTH = 2048
 
 def extract_video_id(youtube_url):
     """Extract video ID from YouTube URL."""
-    if "youtu.be" in youtube_url:
-        # Handle shortened URL format
-        return youtube_url.split("/")[-1].split("?")[0]
-    elif "youtube.com/watch" in youtube_url:
-        # Handle standard URL format
-        import urllib.parse
-        parsed_url = urllib.parse.urlparse(youtube_url)
-        query_params = urllib.parse.parse_qs(parsed_url.query)
-        if 'v' in query_params:
-            return query_params['v'][0]
-        else:
-            raise ValueError("Invalid YouTube URL: missing video ID parameter")
-    else:
+    # Validate before the cached parse so arbitrary client input can't be
+    # used as a cache key
+    if not isinstance(youtube_url, str) or len(youtube_url) > MAX_URL_LENGTH:
         raise ValueError("Invalid YouTube URL format. Please use a standard YouTube URL")
+    return _parse_video_id(youtube_url)
+
+@lru_cache(maxsize=4096)
+def _parse_video_id(youtube_url):
+    """Parse the video ID out of a YouTube URL string."""
+    # Handles both the shortened youtu.be and the standard watch?v= formats
+    match = _VIDEO_ID_RE.search(youtube_url)
+    if match:
+        return match.group(1)
+    if "youtube.com/watch" in youtube_url:
+        raise ValueError("Invalid YouTube URL: missing video ID parameter")
+    raise ValueError("Invalid YouTube URL format. Please use a standard YouTube URL")
 
 def get_video_info(video_id):
     """Get video information from YouTube API."""
+    with _video_info_lock:
+        cached = _video_info_cache.get(video_id)
+    if cached is not None:
+        return cached
+    
     try:
-        request = youtube.videos().list(
-            part="snippet,contentDetails",
-            id=video_id
-        )
-        response = request.execute()
+        with youtube_client() as youtube:
+            request = youtube.videos().list(
+                part="snippet,contentDetails",
+                id=video_id
+            )
+            response = request.execute()
         
         if not response['items']:
             return {"status": "error", "message": "Video not found. Please check the URL and try again."}
@@ -64,12 +328,16 @@ def get_video_info(video_id):
         title = video_info['snippet']['title']
         description = video_info['snippet']['description']
         
-        return {
+        result = {
             "status": "success",
             "title": title,
             "description": description,
             "video_id": video_id
         }
+        # Only successful lookups are cached so transient API errors are retried
+        with _video_info_lock:
+            _video_info_cache[video_id] = result
+        return result
     except googleapiclient.errors.HttpError as e:
         logger.error(f"YouTube API error: {str(e)}")
         return {"status": "error", "message": f"YouTube API error: {str(e)}"}
@@ -79,8 +347,13 @@ def get_video_info(video_id):
 
 def get_video_transcript(video_id):
     """Get transcript for a YouTube video."""
+    cache_key = f"yt:tx:{video_id}"
+    cached = cache_get(cache_key)
+    if cached is not None:
+        return cached
+
     try:
-        transcript_list = YouTubeTranscriptApi.list_transcripts(video_id)
+        transcript_list = transcript_api.list(video_id)
         
         # Try to get English transcript first
         try:
@@ -100,12 +373,14 @@ def get_video_transcript(video_id):
         transcript_data = transcript.fetch()
         
         # Combine all text parts into one transcript
-        full_transcript = ' '.join([part['text'] for part in transcript_data])
+        full_transcript = ' '.join(map(attrgetter('text'), transcript_data))
         
-        return {
+        result = {
             "status": "success",
             "text": full_transcript
         }
+        cache_set(cache_key, TRANSCRIPT_CACHE_TTL, result)
+        return result
     except (TranscriptsDisabled, NoTranscriptFound) as e:
         logger.error(f"No transcript available: {str(e)}")
         return {"status": "error", "message": "No transcript available for this video. Please choose a video with captions."}
@@ -113,17 +388,33 @@ def get_video_transcript(video_id):
         logger.error(f"Error getting transcript: {str(e)}")
         return {"status": "error", "message": f"Error retrieving transcript: {str(e)}"}
 
-def get_captions_from_youtube_api(video_id):
-    """Get captions using YouTube Data API as a fallback method."""
-    try:
-        # First, list available caption tracks
+def list_caption_tracks(video_id):
+    """List caption tracks for a video, caching the result in Redis."""
+    cache_key = f"yt:tracks:{video_id}"
+    cached = cache_get(cache_key)
+    if cached is not None:
+        return cached
+    
+    with youtube_client() as youtube:
         captions_request = youtube.captions().list(
             part="snippet",
             videoId=video_id
         )
         captions_response = captions_request.execute()
-        
-        caption_tracks = captions_response.get('items', [])
+    caption_tracks = captions_response.get('items', [])
+    cache_set(cache_key, CAPTION_TRACKS_CACHE_TTL, caption_tracks)
+    return caption_tracks
+
+def get_captions_from_youtube_api(video_id):
+    """Get captions using YouTube Data API as a fallback method."""
+    cache_key = f"yt:cap:{video_id}"
+    cached = cache_get(cache_key)
+    if cached is not None:
+        return cached
+
+    try:
+        # First, list available caption tracks
+        caption_tracks = list_caption_tracks(video_id)
         if not caption_tracks:
             logger.warning(f"No caption tracks found for video {video_id}")
             return {"status": "error", "message": "No captions available for this video"}
@@ -144,13 +435,14 @@ def get_captions_from_youtube_api(video_id):
             return {"status": "error", "message": "No usable captions found"}
         
         # Download the caption track
-        caption_request = youtube.captions().download(
-            id=caption_id,
-            tfmt='srt'
-        )
-        
-        # Execute request and get the response as bytes
-        caption_data = caption_request.execute()
+        with youtube_client() as youtube:
+            caption_request = youtube.captions().download(
+                id=caption_id,
+                tfmt='srt'
+            )
+            
+            # Execute request and get the response as bytes
+            caption_data = caption_request.execute()
         
         # Convert from bytes to string if needed
         if isinstance(caption_data, bytes):
@@ -161,12 +453,14 @@ def get_captions_from_youtube_api(video_id):
         # Clean up the SRT format to get plain text
         cleaned_text = clean_srt_to_plain_text(caption_text)
         
-        return {
+        result = {
             "status": "success",
             "text": cleaned_text
         }
+        cache_set(cache_key, TRANSCRIPT_CACHE_TTL, result)
+        return result
     except googleapiclient.errors.HttpError as e:
-        error_content = json.loads(e.content.decode('utf-8'))
+        error_content = orjson.loads(e.content)
         error_reason = error_content.get('error', {}).get('errors', [{}])[0].get('reason', '')
         
         if error_reason == 'forbidden':
@@ -181,159 +475,95 @@ def get_captions_from_youtube_api(video_id):
 
 def clean_srt_to_plain_text(srt_content):
     """Convert SRT format to plain text."""
-    lines = srt_content.split('\n')
-    plain_text = []
-    
-    i = 0
-    while i < len(lines):
-        line = lines[i].strip()
-        
-        # Skip empty lines
-        if not line:
-            i += 1
-            continue
-        
-        # Skip line numbers (digits only)
-        if line.isdigit():
-            i += 1
-            continue
-        
-        # Skip timestamp lines (containing -->)
-        if '-->' in line:
-            i += 1
-            continue
-        
-        # Add content lines
-        if line:
-            # Remove HTML tags if present
-            plain_text.append(html.unescape(line))
-        
-        i += 1
-    
-    return ' '.join(plain_text)
+    # Strip cue numbers with their timestamp lines, then any HTML tags
+    text = _SRT_STRIP.sub('', srt_content)
+    text = _TAG_STRIP.sub('', text)
+    return html.unescape(' '.join(text.split()))
 
-def generate_quiz(transcript, video_title, num_questions=5):
-    """Generate a quiz using Gemini API."""
+# Longest transcript (in characters) sent to Gemini for quiz generation
+MAX_TX_CHARS = 30_000
+
+# Static quiz prompt text, joined with the per-request title and content
+_QUIZ_TX_HEAD = '\nGenerate a quiz based on the following transcript from the YouTube video titled "'
+_QUIZ_TX_BODY = '".\n\nTRANSCRIPT:\n'
+
+_QUIZ_DESC_HEAD = '\nGenerate a quiz based on the following YouTube video title and description:\n\nTITLE: '
+_QUIZ_DESC_BODY = '\n\nDESCRIPTION:\n'
+
+_QUIZ_SUFFIX_TEMPLATE = """
+
+Create {n} multiple-choice questions with 4 options each.
+
+Format the response as a JSON array with the following structure for each question:
+{{
+    "question": "The question text",
+    "options": ["Option A", "Option B", "Option C", "Option D"],
+    "correct_answer": "The correct option (A, B, C, or D)",
+    "explanation": "Explanation of why this is the correct answer"
+}}
+
+Only return valid JSON. No additional text before or after the JSON.
+"""
+
+# Suffixes for common quiz sizes are formatted once at import
+_QUIZ_SUFFIX_CACHE = {n: _QUIZ_SUFFIX_TEMPLATE.format(n=n) for n in range(1, 21)}
+
+def _quiz_suffix(num_questions):
+    """Return the answer-format instructions for a quiz of num_questions."""
+    suffix = _QUIZ_SUFFIX_CACHE.get(num_questions)
+    if suffix is None:
+        suffix = _QUIZ_SUFFIX_TEMPLATE.format(n=num_questions)
+    return suffix
+
+def _generate_quiz(prompt, label):
+    """Send a quiz prompt to Gemini and parse the returned JSON array."""
     try:
-        logger.info(f"Generating quiz for: {video_title}")
-        
-        # Setup Gemini model
-        generation_model = genai.GenerativeModel('gemini-1.5-pro')
-        
-        # Craft prompt for Gemini
-        prompt = f"""
-        Generate a quiz based on the following transcript from the YouTube video titled "{video_title}".
-        
-        TRANSCRIPT:
-        {transcript}
-        
-        Create {num_questions} multiple-choice questions with 4 options each.
-        
-        Format the response as a JSON array with the following structure for each question:
-        {{
-            "question": "The question text",
-            "options": ["Option A", "Option B", "Option C", "Option D"],
-            "correct_answer": "The correct option (A, B, C, or D)",
-            "explanation": "Explanation of why this is the correct answer"
-        }}
-        
-        Only return valid JSON. No additional text before or after the JSON.
-        """
+        logger.info(f"Generating quiz {label}")
         
         # Generate quiz with Gemini
-        response = generation_model.generate_content(prompt)
+        response = QUIZ_MODEL.generate_content(prompt)
         
-        # Parse the response
+        # Parse the response; the schema guarantees a bare JSON array of questions
         try:
-            # Try to extract JSON from the response
-            response_text = response.text
-            
-            # Clean up the response to ensure it's valid JSON
-            # Look for JSON array beginning and ending
-            start_idx = response_text.find('[')
-            end_idx = response_text.rfind(']') + 1
-            
-            if start_idx != -1 and end_idx != -1:
-                json_str = response_text[start_idx:end_idx]
-                quiz_data = json.loads(json_str)
-                return {"status": "success", "quiz": quiz_data}
-            else:
-                logger.error("Could not find JSON array in response")
-                return {"status": "error", "message": "Invalid response format from Gemini API"}
-        except json.JSONDecodeError as e:
+            quiz_data = orjson.loads(response.text)
+            return {"status": "success", "quiz": quiz_data}
+        except orjson.JSONDecodeError as e:
             logger.error(f"Failed to parse JSON from Gemini response: {str(e)}")
             return {"status": "error", "message": "Failed to parse quiz data"}
     except Exception as e:
         logger.error(f"Error generating quiz: {str(e)}")
         return {"status": "error", "message": str(e)}
 
+def truncate_transcript(transcript, max_chars=MAX_TX_CHARS):
+    """Bound transcript size by keeping evenly spaced head, middle and tail slices."""
+    if len(transcript) <= max_chars:
+        return transcript
+    
+    k = max_chars // 3
+    middle = len(transcript) // 2
+    head = transcript[:k]
+    mid = transcript[middle - k // 2:middle + k // 2]
+    tail = transcript[-k:]
+    return f"{head}\n...\n{mid}\n...\n{tail}"
+
+def generate_quiz(transcript, video_title, num_questions=5):
+    """Generate a quiz using Gemini API."""
+    transcript = truncate_transcript(transcript)
+    prompt = _QUIZ_TX_HEAD + video_title + _QUIZ_TX_BODY + transcript + _quiz_suffix(num_questions)
+    return _generate_quiz(prompt, f"for: {video_title}")
+
 def generate_quiz_from_description(description, video_title, num_questions=5):
     """Generate a quiz from video description when transcript is not available."""
-    try:
-        logger.info(f"Generating quiz from description for: {video_title}")
-        
-        # Setup Gemini model
-        generation_model = genai.GenerativeModel('gemini-1.5-pro')
-        
-        # Craft prompt for Gemini
-        prompt = f"""
-        Generate a quiz based on the following YouTube video title and description:
-        
-        TITLE: {video_title}
-        
-        DESCRIPTION:
-        {description}
-        
-        Create {num_questions} multiple-choice questions with 4 options each.
-        
-        Format the response as a JSON array with the following structure for each question:
-        {{
-            "question": "The question text",
-            "options": ["Option A", "Option B", "Option C", "Option D"],
-            "correct_answer": "The correct option (A, B, C, or D)",
-            "explanation": "Explanation of why this is the correct answer"
-        }}
-        
-        Only return valid JSON. No additional text before or after the JSON.
-        """
-        
-        # Generate quiz with Gemini
-        response = generation_model.generate_content(prompt)
-        
-        # Parse the response
-        try:
-            # Try to extract JSON from the response
-            response_text = response.text
-            
-            # Clean up the response to ensure it's valid JSON
-            # Look for JSON array beginning and ending
-            start_idx = response_text.find('[')
-            end_idx = response_text.rfind(']') + 1
-            
-            if start_idx != -1 and end_idx != -1:
-                json_str = response_text[start_idx:end_idx]
-                quiz_data = json.loads(json_str)
-                return {"status": "success", "quiz": quiz_data}
-            else:
-                logger.error("Could not find JSON array in response")
-                return {"status": "error", "message": "Invalid response format from Gemini API"}
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse JSON from Gemini response: {str(e)}")
-            return {"status": "error", "message": "Failed to parse quiz data"}
-    except Exception as e:
-        logger.error(f"Error generating quiz: {str(e)}")
-        return {"status": "error", "message": str(e)}
+    prompt = _QUIZ_DESC_HEAD + video_title + _QUIZ_DESC_BODY + description + _quiz_suffix(num_questions)
+    return _generate_quiz(prompt, f"from description for: {video_title}")
 
 def get_message_from_gemini(message_prompt="Tell me something interesting about YouTube"):
     """Generate a message using Gemini API."""
     try:
         logger.info(f"Generating message with prompt: {message_prompt}")
         
-        # Setup Gemini model
-        generation_model = genai.GenerativeModel('gemini-1.5-pro')
-        
         # Generate message with Gemini
-        response = generation_model.generate_content(message_prompt)
+        response = GEMINI_MODEL.generate_content(message_prompt)
         
         return {
             "status": "success", 
@@ -343,6 +573,38 @@ def get_message_from_gemini(message_prompt="Tell me something interesting about
         logger.error(f"Error generating message: {str(e)}")
         return {"status": "error", "message": f"Error generating message: {str(e)}"}
 
+def coalesce_quiz(key, generate, *args):
+    """Run generate(*args) once for all concurrent callers sharing key and cache the quiz."""
+    with _inflight_lock:
+        future = _inflight_quizzes.get(key)
+        is_owner = future is None
+        if is_owner:
+            future = Future()
+            _inflight_quizzes[key] = future
+    
+    if not is_owner:
+        logger.info(f"Joining in-flight quiz generation for {key}")
+        return future.result()
+    
+    try:
+        result = generate(*args)
+        # Cache before leaving the in-flight table so later callers can't
+        # miss both and start another generation
+        if result["status"] == "success":
+            cache_set(key, QUIZ_CACHE_TTL, result["quiz"])
+        future.set_result(result)
+        return result
+    except Exception as e:
+        future.set_exception(e)
+        raise
+    finally:
+        with _inflight_lock:
+            _inflight_quizzes.pop(key, None)
+
+def quiz_cache_key(video_id, num_questions, content_source, source_text):
+    """Build the quiz cache key; the checksum busts entries when the content changes."""
+    return f"quiz:{video_id}:{num_questions}:{content_source}:{zlib.crc32(source_text.encode()):08x}"
+
 @app.route('/')
 def index():
     """Render the main page."""
@@ -370,41 +632,107 @@ def process_youtube_video():
         # Extract video ID from URL
         video_id = extract_video_id(youtube_url)
         
-        # Get video information
-        video_info = get_video_info(video_id)
+        # An earlier fallback that found no caption tracks means neither
+        # transcript method can succeed, so go straight to the description.
+        # Only the cached track list is consulted; listing costs quota
+        no_captions = cache_get(f"yt:tracks:{video_id}") == []
+        
+        # Fetch video information and transcript concurrently, since both
+        # are independent network calls; the primary transcript method
+        # is youtube_transcript_api
+        info_future = executor.submit(get_video_info, video_id)
+        transcript_future = None
+        if not no_captions:
+            transcript_future = executor.submit(get_video_transcript, video_id)
+        
+        video_info = info_future.result()
         if video_info["status"] == "error":
             return jsonify(video_info), 500
         
-        # Try to get transcript using youtube_transcript_api first
-        transcript_result = get_video_transcript(video_id)
+        # If the transcript is slow to arrive, speculatively generate the
+        # description-based quiz, so videos without captions don't wait for
+        # Gemini after the transcript lookups fail; the finished quiz is
+        # cached even when the transcript wins
+        description_future = None
+        if SPECULATIVE_QUIZ and not no_captions:
+            wait([transcript_future], timeout=SPECULATIVE_QUIZ_WAIT)
+            transcript_ready = transcript_future.done() and transcript_future.result()["status"] == "success"
+            description_key = quiz_cache_key(video_id, num_questions, "description", video_info["description"])
+            if not transcript_ready and cache_get(description_key) is None:
+                description_future = quiz_executor.submit(
+                    coalesce_quiz,
+                    description_key,
+                    generate_quiz_from_description,
+                    video_info["description"],
+                    video_info["title"],
+                    num_questions
+                )
+        
+        if no_captions:
+            logger.info(f"No caption tracks for video {video_id}, skipping transcript lookup")
+            transcript_result = {"status": "error", "message": "No captions available for this video"}
+        else:
+            transcript_result = transcript_future.result()
         
-        # If transcript is not available, try using the YouTube Data API as fallback
-        if transcript_result["status"] == "error":
-            logger.info(f"Primary transcript method failed, trying fallback method")
-            transcript_result = get_captions_from_youtube_api(video_id)
+            # If transcript is not available, try using the YouTube Data API as fallback
+            if transcript_result["status"] == "error":
+                logger.info(f"Primary transcript method failed, trying fallback method")
+                transcript_result = get_captions_from_youtube_api(video_id)
         
         # If transcript is still not available, use the video description
         if transcript_result["status"] == "success":
+            content_source = "transcript"
+            source_text = transcript_result["text"]
+            if description_future is not None:
+                description_future.cancel()
+        else:
+            content_source = "description"
+            source_text = video_info["description"]
+        
+        # Reuse a previously generated quiz for the same content
+        cache_key = quiz_cache_key(video_id, num_questions, content_source, source_text)
+        cached_quiz = cache_get(cache_key)
+        
+        # Otherwise reuse a quiz generated for a near-identical transcript,
+        # e.g. a re-upload or mirror of the same video
+        embedding = None
+        if cached_quiz is None and content_source == "transcript":
+            embedding = embed_transcript(source_text)
+            cached_quiz = find_similar_quiz(embedding, num_questions)
+            if cached_quiz is not None:
+                cache_set(cache_key, QUIZ_CACHE_TTL, cached_quiz)
+        
+        if cached_quiz is not None:
+            quiz_result = {"status": "success", "quiz": cached_quiz}
+        elif content_source == "transcript":
             # Generate quiz from transcript
-            quiz_result = generate_quiz(
-                transcript_result["text"], 
+            quiz_result = coalesce_quiz(
+                cache_key,
+                generate_quiz,
+                source_text,
                 video_info["title"],
                 num_questions
             )
-            content_source = "transcript"
+        elif description_future is not None:
+            logger.info("No transcript available, using speculative description-based quiz")
+            quiz_result = description_future.result()
         else:
             # Generate quiz from description as a last resort
             logger.info(f"No transcript available, using video description for quiz generation")
-            quiz_result = generate_quiz_from_description(
-                video_info["description"],
+            quiz_result = coalesce_quiz(
+                cache_key,
+                generate_quiz_from_description,
+                source_text,
                 video_info["title"],
                 num_questions
             )
-            content_source = "description"
         
         if quiz_result["status"] == "error":
             return jsonify(quiz_result), 500
         
+        if cached_quiz is None and embedding is not None:
+            store_similar_quiz(video_id, num_questions, embedding, quiz_result["quiz"])
+        
         return jsonify({
             "status": "success",
             "video_title": video_info["title"],
@@ -420,6 +748,7 @@ def process_youtube_video():
         return jsonify({"status": "error", "message": str(e)}), 500
 
 if __name__ == '__main__':
+    # Local development server; production runs under gunicorn (gunicorn.conf.py)
     # Use environment variable for port or default to 5000
     port = int(os.environ.get('PORT', 5000))
     # Don't use debug mode in production
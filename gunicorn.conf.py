@@ -0,0 +1,20 @@
+import multiprocessing
+import os
+
+# Gunicorn configuration for serving the app in production, e.g.
+# `gunicorn app:app`. Requests spend most of their time waiting on YouTube
+# and Gemini, so gevent workers keep many of them in flight per process.
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = "gevent"
+worker_connections = int(os.environ.get('WORKER_CONNECTIONS', 200))
+keepalive = 5
+# Quiz generation can take tens of seconds on long videos
+timeout = 120
+
+def post_worker_init(worker):
+    """Make gRPC (used by the Gemini client) cooperate with gevent."""
+    # The gevent worker has already applied monkey.patch_all() to the
+    # stdlib, so requests and httplib2 sockets yield to other greenlets
+    import grpc.experimental.gevent as grpc_gevent
+    grpc_gevent.init_gevent()